@@ -33,7 +33,7 @@ from mpl_toolkits.axes_grid1 import make_axes_locatable
 import matplotlib
 
 # import lts calculation functions
-from lts_functions import (biking_permitted, is_separated_path, is_bike_lane, parking_present, 
+from lts_functions import (prepare_edges, biking_permitted, is_separated_path, is_bike_lane, parking_present, get_lanes, get_max_speed,
                            bike_lane_analysis_no_parking, bike_lane_analysis_with_parking, mixed_traffic)
 
 # ## Extract OSM tags to use in download
@@ -108,6 +108,13 @@ fig, ax = ox.plot_graph(G, node_size=0, edge_color="w", edge_linewidth=0.2)
 # convert graph to node and edge GeoPandas GeoDataFrames
 gdf_nodes, gdf_edges = ox.graph_to_gdfs(G)
 
+# convert tag columns to faster dtypes once, before the edges are split up
+gdf_edges = prepare_edges(gdf_edges)
+
+# lanes and speeds are used by several of the analyses below, work them out once for all edges
+gdf_edges = get_lanes(gdf_edges)
+gdf_edges = get_max_speed(gdf_edges)
+
 print(gdf_edges.shape)
 gdf_allowed, gdf_not_allowed = biking_permitted(gdf_edges)
 print(gdf_allowed.shape)
@@ -128,13 +135,19 @@ parking_detected, parking_not_detected = parking_present(to_analyze)
 print(parking_detected.shape)
 print(parking_not_detected.shape)
 
-parking_lts = bike_lane_analysis_with_parking(parking_detected)
+# the analyses add columns, so give them their own copy rather than a slice of unseparated_edges
+parking_lts = bike_lane_analysis_with_parking(parking_detected.copy())
 
-no_parking_lts = bike_lane_analysis_no_parking(parking_not_detected)
+no_parking_lts = bike_lane_analysis_no_parking(parking_not_detected.copy())
 
 # Next, go to the last step - mixed traffic
 
-lts_no_lane = mixed_traffic(no_lane)
+# edges that match no mixed traffic rule get rule 'm0' and no lts (NA).
+# This only happens when maxspeed_assumed is nan, which get_max_speed never gives,
+# since untagged or unreadable speeds get a speed assumed from the road type.
+# The bike lane analyses have no such rule: a nan speed fails all their speed checks,
+# so those edges would get 'b1'/'c1' (lts 1) if they had a nan speed.
+lts_no_lane = mixed_traffic(no_lane.copy())
 
 # final components: lts_no_lane, parking_lts, no_parking_lts, separated_edges
 # these should all add up to gdf_allowed
@@ -188,7 +201,8 @@ rule_message_dict = {'p2':'Cycling not permitted due to bicycle=\'no\' tag.',
                      'm9':'Setting LTS to 2 because maxspeed is up to 50 km/h and lanes are 2 or less and highway=\'residential\'.', 
                      'm10':'Setting LTS to 3 because maxspeed is up to 50 km/h and lanes are 3 or less on non-residential highway.', 
                      'm11':'Setting LTS to 4 because the number of lanes is greater than 3.', 
-                     'm12':'Setting LTS to 4 because maxspeed is greater than 50 km/h.'}
+                     'm12':'Setting LTS to 4 because maxspeed is greater than 50 km/h.',
+                     'm0':'No LTS assigned because no mixed traffic rule applies, maxspeed is unknown.'}
 
 
 simplified_message_dict = {'p2':r'bicycle $=$ "no"', 
@@ -232,7 +246,8 @@ simplified_message_dict = {'p2':r'bicycle $=$ "no"',
                      'm9':r'mixed traffic, speed $\leq$ 50 km/h, highway $=$ "residential",$\leq$ 2 lanes', 
                      'm10':r'mixed traffic, speed $\leq$ 50 km/h, highway $\neq$ "residential", $\leq$ 3 lanes', 
                      'm11':r'mixed traffic, speed $\leq$ 50 km/h, lanes $>$ 3', 
-                     'm12':r'mixed traffic, speed $>$ 50 km/h'}
+                     'm12':r'mixed traffic, speed $>$ 50 km/h',
+                     'm0':r'mixed traffic, speed unknown, no LTS'}
 
 all_lts['message'] = all_lts['rule'].map(rule_message_dict)
 all_lts['short_message'] = all_lts['rule'].map(simplified_message_dict)
@@ -260,7 +275,10 @@ for node in tqdm(gdf_nodes.index):
         gdf_nodes.loc[node, 'message'] = "Node not found in edges"
         continue
     control = gdf_nodes.loc[node,'highway'] # if there is a traffic control
-    max_lts = edges['lts'].max()
+    max_lts = edges['lts'].max() # edges without an lts ('m0') are skipped
+    if pd.isna(max_lts):
+        gdf_nodes.loc[node, 'message'] = "No intersecting LTS"
+        continue
     node_lts = int(max_lts) # set to max of intersecting roads
     message = "Node LTS is max intersecting LTS"
     if node_lts > 2:
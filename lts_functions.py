@@ -1,7 +1,138 @@
-import pytest
+import importlib.util
+import warnings
 import pandas as pd
 import numpy as np
 
+# compiled decision trees, each kernel is None if numba isn't installed
+import lts_kernels
+
+# pyarrow backed strings, with nan for missing values so comparisons give plain booleans
+# pyarrow is optional, without it (or with a pandas too old for this dtype) string columns are left as python strings
+ARROW_STRING = None
+if importlib.util.find_spec('pyarrow') is not None:
+    try:
+        ARROW_STRING = pd.StringDtype('pyarrow', na_value = np.nan)
+    except TypeError:
+        # pandas 2.1 and 2.2 call this dtype 'string[pyarrow_numpy]', earlier versions don't have it
+        try:
+            ARROW_STRING = pd.api.types.pandas_dtype('string[pyarrow_numpy]')
+        except TypeError:
+            pass
+
+# tag columns that hold a small set of repeated strings
+CATEGORY_TAGS = ('highway', 'footway', 'bicycle', 'access', 'service', 'motor_vehicle', 'maxspeed', 'construction')
+
+def _categorize(gdf_edges, tags = CATEGORY_TAGS):
+    """
+    Convert tag columns to the pandas category dtype, so comparisons like
+    gdf_edges['highway'] == 'motorway' compare integer codes instead of strings.
+    Missing columns, and columns holding lists (which can't be categories), are left as they are.
+    """
+    for tag in tags:
+        if tag in gdf_edges.columns and not isinstance(gdf_edges[tag].dtype, pd.CategoricalDtype):
+            try:
+                gdf_edges[tag] = gdf_edges[tag].astype('category')
+            except TypeError:
+                # osmnx makes a list of values when several ways are merged into one edge
+                pass
+    
+    return gdf_edges
+
+def prepare_edges(gdf_edges):
+    """
+    Prepare a dataframe of edges for the LTS analysis. Call this once, before splitting
+    the edges up with any of the classifiers (biking_permitted, is_separated_path, is_bike_lane,
+    parking_present and the analyses), so every part shares the faster dtypes.
+    
+    Tag columns with a small set of values become categories (see CATEGORY_TAGS), and other
+    columns of strings are stored as pyarrow strings if pyarrow is installed, so comparisons
+    on them don't go through python string objects.
+    Columns holding lists of values from merged ways are left as they are.
+    
+    Inputs:
+    gdf_edges : a dataframe of network edges downloaded using the package osmnx
+    
+    Returns:
+    gdf_edges : the same dataframe with its tag columns converted
+
+    This is the only function here that changes the dtypes of gdf_edges, the classifiers
+    work with whatever dtypes they are given. Categories can't take new values, so set any
+    tags by hand before calling this, i.e. gdf_edges.loc[0, 'highway'] = 'tertiary'.
+    """
+    gdf_edges = _categorize(gdf_edges)
+    
+    if ARROW_STRING is not None:
+        for column in gdf_edges.columns:
+            if gdf_edges[column].dtype == object and pd.api.types.infer_dtype(gdf_edges[column], skipna = True) == 'string':
+                gdf_edges[column] = gdf_edges[column].astype(ARROW_STRING)
+    
+    return gdf_edges
+
+def _tag_columns(columns, text):
+    """
+    Get the names in columns, the column index of an edges dataframe, that contain text.
+    Looping over the names as a list is quicker than columns.str.contains for the few hundred tags osmnx gives.
+    """
+    return [column for column in columns.tolist() if isinstance(column, str) and text in column]
+
+def _has_value(gdf_edges, tag, value):
+    """
+    Check if each edge has value for tag, as a numpy boolean array.
+    Missing values are False, also in nullable string or boolean columns, where == gives NA.
+    """
+    return (gdf_edges[tag] == value).to_numpy(dtype=bool, na_value=False)
+
+def _any_tag_value(gdf_edges, tags, values):
+    """
+    Check if any of the tag columns in tags has one of values for each edge.
+    Columns are checked one at a time, so only one boolean array the length of gdf_edges is built.
+    """
+    found = np.zeros(len(gdf_edges), dtype=bool)
+    for tag in tags:
+        np.logical_or(found, gdf_edges[tag].isin(values).to_numpy(dtype=bool, na_value=False), out=found)
+    
+    return found
+
+def _first_match(conditions, default, first_code = 0):
+    """
+    Like np.select(conditions, range(first_code, first_code + len(conditions)), default),
+    where the first condition that holds gives the code, but kept as int8 throughout.
+    The codes are filled in from the last condition to the first,
+    so an earlier condition overwrites a later one.
+    """
+    codes = np.full(len(conditions[0]), default, dtype='int8')
+    for code in range(len(conditions) - 1, -1, -1):
+        np.putmask(codes, np.asarray(conditions[code]), first_code + code)
+    
+    return codes
+
+def _tag_codes(gdf_edges, tag, values):
+    """
+    Get an integer code for each edge's tag value: 
+    the position of the value in values, or -1 if it isn't one of them.
+    """
+    column = gdf_edges[tag]
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # look up each category once, nan has code -1 and picks the extra -1 at the end
+        lookup = np.array([values.index(c) if c in values else -1 for c in column.cat.categories] + [-1], dtype='int8')
+        return lookup[column.cat.codes.to_numpy()]
+    
+    return _first_match([_has_value(gdf_edges, tag, value) for value in values], default=-1)
+
+def _not_permitted_conditions(gdf_edges):
+    """
+    Conditions under which cycling is not permitted on an edge,
+    in the same order as the rule labels ['p2', 'p6', 'p3', 'p4', 'p7', 'p5'].
+    """
+    return [_has_value(gdf_edges, 'bicycle', 'no'), # p2
+            _has_value(gdf_edges, 'access', 'no'), # p6
+            _has_value(gdf_edges, 'highway', 'motorway'), # p3
+            _has_value(gdf_edges, 'highway', 'motorway_link'), #p4
+            _has_value(gdf_edges, 'highway', 'proposed'), # p7
+            (_has_value(gdf_edges, 'footway', 'sidewalk') & ~_has_value(gdf_edges, 'bicycle', 'yes')
+              & _any_tag_value(gdf_edges, ['highway'], ['footway', 'path'])) # p5
+           ]
+
 def biking_permitted(gdf_edges):
     """
     Categorize ways as biking permitted or not permitted. 
@@ -16,30 +147,30 @@ def biking_permitted(gdf_edges):
     
     Returns:
     gdf_allowed : a dataframe of edges after removing ways where cycling is not permitted
-    gdf_not_allowed : a dataframe of edges where cycling is not permitted
+    gdf_not_allowed : a dataframe of edges where cycling is not permitted, 
+                      with the 'rule' column saying why
     
     gdf_allowed and gdf_not_allowed together are the entire contents of gdf_edges.
     """
-    conditions = [(gdf_edges['bicycle'] == 'no'), # p2
-                  (gdf_edges['access'] == 'no'), # p6
-                  (gdf_edges['highway'] == 'motorway'), # p3
-                  (gdf_edges['highway'] == 'motorway_link'), #p4
-                  (gdf_edges['highway'] == 'proposed'), # p7
-                  ((gdf_edges['footway'] == 'sidewalk') & ~(gdf_edges['bicycle'] == 'yes')
-                    & ((gdf_edges['highway'] == 'footway') | (gdf_edges['highway'] == 'path'))) # p5
-                 ]
-    
-    
-    values = ['p2', 'p6', 'p3', 'p4', 'p7', 'p5']
-                  
-    # create a new column and use np.select to assign values to it using our lists as arguments
-    gdf_edges['rule'] = np.select(conditions, values, default='p0')
-
-    # filter based on rule assignment
-    gdf_allowed = gdf_edges[gdf_edges['rule'] == 'p0']
-    gdf_not_allowed = gdf_edges[~(gdf_edges['rule'] == 'p0')]
-    
-    gdf_not_allowed = gdf_not_allowed
+    rules = ['p2', 'p6', 'p3', 'p4', 'p7', 'p5']
+    
+    # position of each edge's rule in rules, -1 if cycling is permitted
+    if lts_kernels.not_permitted_kernel is not None:
+        rule_codes = lts_kernels.not_permitted_kernel(
+            _tag_codes(gdf_edges, 'bicycle', lts_kernels.NOT_PERMITTED_BICYCLE),
+            _has_value(gdf_edges, 'access', 'no'),
+            _tag_codes(gdf_edges, 'highway', lts_kernels.NOT_PERMITTED_HIGHWAYS),
+            _has_value(gdf_edges, 'footway', 'sidewalk'),
+        )
+    else:
+        rule_codes = _first_match(_not_permitted_conditions(gdf_edges), default=-1)
+    not_allowed = rule_codes >= 0
+    
+    gdf_allowed = gdf_edges[~not_allowed]
+    
+    # only edges where cycling is not permitted get a rule here; the rest get one from later analysis
+    # rules are stored as integer codes into the list of rules
+    gdf_not_allowed = gdf_edges[not_allowed].assign(rule = pd.Categorical.from_codes(rule_codes[not_allowed], categories = rules))
                   
     return gdf_allowed, gdf_not_allowed
 
@@ -61,29 +192,33 @@ def is_separated_path(gdf_edges):
     
     construction bit:
                    | ((gdf_edges['highway'] == 'construction') 
-                      & ((gdf_edges['construction'] == 'path') | (gdf_edges['construction'] == 'footway') | (gdf_edges['construction'] == 'cycleway')))
+                      & gdf_edges['construction'].isin(['path', 'footway', 'cycleway']))
     """
-    
-
-    
     # get the columns that start with 'cycleway'
-    cycleway_tags = gdf_edges.columns[gdf_edges.columns.str.contains('cycleway')]
-    
-    conditions = [(gdf_edges['highway'] == 'cycleway'), # s3
-                  (gdf_edges['highway'] == 'path'), #s1
-                  ((gdf_edges['highway'] == 'footway') & ~(gdf_edges['footway'] == 'crossing')), #s2
-                  (np.any(gdf_edges[cycleway_tags] == 'track', axis = 1)) , # s7
-                  (np.any(gdf_edges[cycleway_tags] == 'opposite_track', axis = 1)) # s8
-                  ]
-    
-    values = ['s3', 's1', 's2', 's7', 's8']
-    
-    # create a new column and use np.select to assign values to it using our lists as arguments
-    gdf_edges['rule'] = np.select(conditions, values, default='s0')
-    
-    separated = gdf_edges[gdf_edges['rule'] != 's0']
-    not_separated = gdf_edges[gdf_edges['rule'] == 's0']
-    not_separated = not_separated.drop(columns = 'rule')
+    cycleway_tags = _tag_columns(gdf_edges.columns, 'cycleway')
+    
+    rules = ['s3', 's1', 's2', 's7', 's8']
+    
+    # position of each edge's rule in rules, -1 if it isn't a separated path
+    if lts_kernels.separated_path_kernel is not None:
+        rule_codes = lts_kernels.separated_path_kernel(
+            _tag_codes(gdf_edges, 'highway', lts_kernels.SEPARATED_PATH_HIGHWAYS),
+            _has_value(gdf_edges, 'footway', 'crossing'),
+            _any_tag_value(gdf_edges, cycleway_tags, ['track']),
+            _any_tag_value(gdf_edges, cycleway_tags, ['opposite_track']),
+        )
+    else:
+        conditions = [_has_value(gdf_edges, 'highway', 'cycleway'), # s3
+                      _has_value(gdf_edges, 'highway', 'path'), #s1
+                      (_has_value(gdf_edges, 'highway', 'footway') & ~_has_value(gdf_edges, 'footway', 'crossing')), #s2
+                      _any_tag_value(gdf_edges, cycleway_tags, ['track']), # s7
+                      _any_tag_value(gdf_edges, cycleway_tags, ['opposite_track']) # s8
+                      ]
+        rule_codes = _first_match(conditions, default=-1)
+    is_separated = rule_codes >= 0
+    
+    separated = gdf_edges[is_separated].assign(rule = pd.Categorical.from_codes(rule_codes[is_separated], categories = rules))
+    not_separated = gdf_edges[~is_separated]
     
     return separated, not_separated
 
@@ -92,14 +227,14 @@ def is_bike_lane(gdf_edges):
     Check if there's a bike lane, use road features to assign LTS
     """
     # tags that start with 'cycleway'
-    cycleway_tags = gdf_edges.columns[gdf_edges.columns.str.contains('cycleway')]
+    cycleway_tags = _tag_columns(gdf_edges.columns, 'cycleway')
     lane_identifiers = ['crossing', 'lane', 'left', 'opposite', 'opposite_lane', 'right', 'yes']
     
     if 'shoulder:access:bicycle' in gdf_edges.columns:
-        lane_check = ((np.any(gdf_edges[cycleway_tags].isin(lane_identifiers), axis = 1))
-                              | (gdf_edges['shoulder:access:bicycle'] == 'yes'))
+        lane_check = (_any_tag_value(gdf_edges, cycleway_tags, lane_identifiers)
+                              | _has_value(gdf_edges, 'shoulder:access:bicycle', 'yes'))
     else: 
-        lane_check = np.any(gdf_edges[cycleway_tags].isin(lane_identifiers), axis = 1)
+        lane_check = _any_tag_value(gdf_edges, cycleway_tags, lane_identifiers)
         
     to_analyze = gdf_edges[lane_check]
     no_lane = gdf_edges[~lane_check]
@@ -109,25 +244,53 @@ def is_bike_lane(gdf_edges):
 def parking_present(gdf_edges):
     """
     Splits gdf_edges into two dataframes, one where parking is detected, the oterh where it isn't.
-    
     """
-    parking_tags = gdf_edges.columns[gdf_edges.columns.str.contains('parking')]
+    parking_tags = _tag_columns(gdf_edges.columns, 'parking')
     parking_identifiers = ['yes', 'parallel', 'perpendicular', 'diagonal', 'marked']
-    parking_check = np.any(gdf_edges[parking_tags].isin(parking_identifiers), axis = 1)
+    parking_check = _any_tag_value(gdf_edges, parking_tags, parking_identifiers)
     
     parking_detected = gdf_edges[parking_check]
     parking_not_detected = gdf_edges[~parking_check]
     
     return parking_detected, parking_not_detected
 
+def _leading_number(strings):
+    """
+    Read the number at the start of each string in strings, a series of strings,
+    i.e. 35 from '35 mph'. Strings that don't start with a number are nan.
+    """
+    return pd.to_numeric(strings.str.extract(r'^\s*([0-9.]+)', expand=False), errors='coerce').to_numpy(dtype=float)
+
+def _max_value(values, parse = _leading_number):
+    """
+    Get the largest number in each entry of values.
+    An entry can be a single value, a list of values (osmnx makes a list when several ways
+    are merged into one edge) or a string of values separated by ';'.
+    Each value is read with parse, which takes a series of strings and returns an array of numbers;
+    by default the number at the start of the value is used, so '25 mph' is 25.
+    Entries where no value could be read are nan.
+    """
+    # one row per value, indexed by the position of the entry it came from
+    exploded = pd.Series(values.to_numpy(), dtype=object).explode()
+    exploded = exploded.astype('string').str.split(';').explode().astype('string')
+    numbers = pd.Series(parse(exploded), index=exploded.index)
+    
+    return numbers.groupby(level=0).max().to_numpy()
+
 def get_lanes(gdf_edges, default_lanes = 2):
 
     # make new assumed lanes column for use in calculations
     
-    # fill na with default lanes
+    # already worked out, i.e. for the whole network before it was split up
+    if 'lanes_assumed' in gdf_edges.columns:
+        return gdf_edges
+    
     # if multiple lane values present, use the largest one
     # this usually happens if multiple adjacent ways are included in the edge and there's a turning lane
-    gdf_edges['lanes_assumed'] = gdf_edges['lanes'].fillna(default_lanes).apply(lambda x: np.array(x, dtype = 'int')).apply(lambda x: np.max(x)) 
+    lanes = _max_value(gdf_edges['lanes'])
+    
+    # fill na with default lanes
+    gdf_edges['lanes_assumed'] = np.where(np.isnan(lanes), default_lanes, lanes).astype('int32')
     
     return gdf_edges
 
@@ -184,6 +347,51 @@ def parse_speed(speed_string):
     if np.isnan(speed_string):
         return np.nan
 
+def _parse_speeds(speed_strings, units = None):
+    """
+    Vectorized parse_speed for speed_strings, a series of strings: the number at the start
+    of each string, interpreted by its units.
+    Strings that don't start with a number, i.e. 'national', are nan.
+    
+    units : None to convert knots to mph and use mph and bare numbers as-is, like parse_speed,
+            or 'kph' or 'mph' to convert every speed to those units;
+            bare numbers are km/h, as in OpenStreetMap
+    """
+    is_knots = speed_strings.str.contains('knots', na=False).to_numpy(dtype=bool)
+    is_mph = speed_strings.str.contains('mph', na=False).to_numpy(dtype=bool)
+    speed = _leading_number(speed_strings)
+    
+    if units == 'kph':
+        return np.where(is_knots, mph_to_kph(knots_to_mph(speed)), np.where(is_mph, mph_to_kph(speed), speed))
+    if units == 'mph':
+        return np.where(is_knots, knots_to_mph(speed), np.where(is_mph, speed, kph_to_mph(speed)))
+    
+    return np.where(is_knots, knots_to_mph(speed), speed)
+
+def _read_speed_tags(maxspeed, units, known = ()):
+    """
+    Read the maxspeed tag of each edge with _parse_speeds, converted to units ('kph' or 'mph'),
+    using the largest value when there are several (see _max_value).
+    
+    Returns:
+    speeds : the speed for each edge, nan where there is no tag or it couldn't be read
+    untagged : True for edges that need a speed assumed from the road type,
+               because they have no tag or it couldn't be read
+    
+    Tags that couldn't be read are reported with a warning, except the values in known,
+    which the caller assigns a speed to itself.
+    """
+    tagged = maxspeed.notna().to_numpy()
+    speeds = np.full(len(maxspeed), np.nan)
+    speeds[tagged] = _max_value(maxspeed[tagged], parse = lambda speed_strings: _parse_speeds(speed_strings, units))
+    
+    unread = tagged & np.isnan(speeds) & ~maxspeed.isin(known).to_numpy(dtype=bool, na_value=False)
+    if unread.any():
+        warnings.warn('could not read maxspeed tags %s, assuming a speed from the road type instead'
+                      % sorted(set(str(value) for value in maxspeed[unread])))
+    
+    return speeds, ~tagged | unread
+
 def clean_speeds(
         gdf_edges,
         key = 'maxspeed',
@@ -199,7 +407,9 @@ def clean_speeds(
     if newkey is None:
         newkey = key + '_' + units
 
-    gdf_edges[newkey] = gdf_edges[key].apply(parse_speed)
+    # parse the whole column at once rather than calling parse_speed on each row
+    # anything unparseable becomes nan
+    gdf_edges[newkey] = _parse_speeds(gdf_edges[key].astype('string'))
 
     return gdf_edges
 
@@ -213,32 +423,38 @@ def get_max_speed(gdf_edges, national=40, local=50, motorway=100, primary=80, se
     speeds in US are in miles/hour, original LTS definitions were in mph.
     OSM default speeds (with no units) are km/hr.
     If a unit is specified, then they will appear as a string '35 mph'
+    
+    If gdf_edges already has a 'maxspeed_assumed' column it is returned unchanged,
+    so speeds can be worked out once for the whole network before it is split up.
     """
-    pd.options.mode.chained_assignment = None  # default='warn'
+    if 'maxspeed_assumed' in gdf_edges.columns:
+        return gdf_edges
+    
+    # read the maxspeed tags, if multiple speed values present, use the largest one
+    # edges without a tag, or with one that can't be read, get a speed assumed from the road type
+    speeds, untagged = _read_speed_tags(gdf_edges['maxspeed'], 'kph', known = ['national'])
+    
     # create a list of conditions
     # When multiple conditions are satisfied, the first one encountered in conditions is used
     conditions = [
-        (gdf_edges['maxspeed'] == 'national'),
-        (gdf_edges['maxspeed'].isna()) & (gdf_edges['highway'] == 'motorway'),
-        (gdf_edges['maxspeed'].isna()) & (gdf_edges['highway'] == 'primary'),
-        (gdf_edges['maxspeed'].isna()) & (gdf_edges['highway'] == 'secondary'),
-        (gdf_edges['maxspeed'].isna()),
+        _has_value(gdf_edges, 'maxspeed', 'national'),
+        untagged & _has_value(gdf_edges, 'highway', 'motorway'),
+        untagged & _has_value(gdf_edges, 'highway', 'primary'),
+        untagged & _has_value(gdf_edges, 'highway', 'secondary'),
+        untagged,
         ]
 
     # create a list of the values we want to assign for each condition
     values = [national, motorway, primary, secondary, local]
 
-    # create a new column and use np.select to assign values to it using our lists as arguments
-    gdf_edges['maxspeed_assumed'] = np.select(conditions, values, default=gdf_edges['maxspeed'])
-    
-    # if multiple speed values present, use the largest one
-    gdf_edges['maxspeed_assumed'] = gdf_edges['maxspeed_assumed'].apply(lambda x: np.array(x, dtype = 'int')).apply(lambda x: np.max(x)) 
+    # use np.select to assign the assumed speeds, the other edges keep the speed from their tag
+    gdf_edges['maxspeed_assumed'] = np.select(conditions, values, default=speeds).astype(float)
 
     return gdf_edges
 
 def get_max_speed_us(
         gdf_edges,
-        #local=50, # default speed for roads in city removed from original
+        local=25, # mph, was 50 kph, default speed for roads in city not listed below
         motorway=80, #mph, was 100 kph, in US, interstate type roads
         primary=60, # mph, was 80 kph
         secondary=35, # mph, was 80 kph
@@ -257,134 +473,205 @@ def get_max_speed_us(
     speeds in US are in miles/hour, original LTS definitions were in mph.
     OSM default speeds (with no units) are km/hr.
     If a unit is specified, then they will appear as a string '35 mph'
+    
+    If gdf_edges already has a 'maxspeed_assumed' column it is returned unchanged,
+    so speeds can be worked out once for the whole network before it is split up.
     """
-    pd.options.mode.chained_assignment = None  # default='warn'
+    if 'maxspeed_assumed' in gdf_edges.columns:
+        return gdf_edges
+    
+    # read the maxspeed tags, if multiple speed values present, use the largest one
+    # edges without a tag, or with one that can't be read, get a speed assumed from the road type
+    # the original 'national' condition is not used, it's unclear what 'national' represents,
+    # so a 'national' tag is treated like a missing one, with a warning
+    speeds, untagged = _read_speed_tags(gdf_edges['maxspeed'], 'mph')
+    
     # create a list of conditions
     # When multiple conditions are satisfied, the first one encountered in conditions is used
-    # conditions = [
-    #     (gdf_edges['maxspeed'] == 'national'),        # unclear what 'national' represents
-    #     (gdf_edges['maxspeed'].isna()) & (gdf_edges['highway'] == 'motorway'),
-    #     (gdf_edges['maxspeed'].isna()) & (gdf_edges['highway'] == 'primary'),
-    #     (gdf_edges['maxspeed'].isna()) & (gdf_edges['highway'] == 'secondary'),
-    #     (gdf_edges['maxspeed'].isna()),
-    #     ]
-    create a list of conditions
-    When multiple conditions are satisfied, the first one encountered in conditions is used
     conditions = [
-        (gdf_edges['maxspeed'].isna()) & (gdf_edges['highway'] == 'motorway'),
-        (gdf_edges['maxspeed'].isna()) & (gdf_edges['highway'] == 'primary'),
-        (gdf_edges['maxspeed'].isna()) & (gdf_edges['highway'] == 'secondary'),
-        (gdf_edges['maxspeed'].isna()) & (gdf_edges['highway'] == 'tertiary'),
-        (gdf_edges['maxspeed'].isna()) & (gdf_edges['highway'] == 'residential'),
-        (gdf_edges['maxspeed'].isna()),
+        untagged & _has_value(gdf_edges, 'highway', 'motorway'),
+        untagged & _has_value(gdf_edges, 'highway', 'primary'),
+        untagged & _has_value(gdf_edges, 'highway', 'secondary'),
+        untagged & _has_value(gdf_edges, 'highway', 'tertiary'),
+        untagged & _has_value(gdf_edges, 'highway', 'residential'),
+        untagged,
         ]
     
     # create a list of the values we want to assign for each condition
-    values = [motorway, primary, secondary, tertiary, resdidential]
+    values = [motorway, primary, secondary, tertiary, residential, local]
 
-    # create a new column and use np.select to assign values to it using our lists as arguments
-    gdf_edges['maxspeed_assumed'] = np.select(conditions, values, default=gdf_edges['maxspeed'])
-    
-    # if multiple speed values present, use the largest one
-    gdf_edges['maxspeed_assumed'] = gdf_edges['maxspeed_assumed'].apply(lambda x: np.array(x, dtype = 'int')).apply(lambda x: np.max(x)) 
+    # use np.select to assign the assumed speeds, the other edges keep the speed from their tag
+    gdf_edges['maxspeed_assumed'] = np.select(conditions, values, default=speeds).astype(float)
 
     return gdf_edges
 
-def bike_lane_analysis_with_parking(gdf_edges):
+# Each analysis below has a list of the rules it assigns, the default rule first and then the rest
+# in the order of its conditions, and an array of the lts each rule gives.
+# Edges get a rule code, the position of their rule in the list, rather than the rule string,
+# and their lts is looked up from the rule code.
+
+def _bike_lane_values(gdf_edges):
+    """
+    Get the values the bike lane analyses check, adding lanes, speed and numeric width to gdf_edges.
+    
+    Returns:
+    lanes, speed, width : numpy arrays, widths that aren't a number are nan
+    residential : numpy boolean array, True where highway is 'residential'
+    """
     # get lanes, width, speed
     gdf_edges = get_lanes(gdf_edges)
     gdf_edges = get_max_speed(gdf_edges)
     
-    # create a list of lts conditions
-    # When multiple conditions are satisfied, the first one encountered in conditions is used
-    conditions = [
-        (gdf_edges['lanes_assumed'] >= 3) & (gdf_edges['maxspeed_assumed'] <= 55),
-        (gdf_edges['width'] <= 4.1),
-        (gdf_edges['width'] <= 4.25),
-        (gdf_edges['width'] <= 4.5) & ((gdf_edges['maxspeed_assumed'] <= 40) & (gdf_edges['highway'] == 'residential')),
-        (gdf_edges['maxspeed_assumed'] > 40) & (gdf_edges['maxspeed_assumed'] <= 50),
-        (gdf_edges['maxspeed_assumed'] > 50) & (gdf_edges['maxspeed_assumed'] <= 55),
-        (gdf_edges['maxspeed_assumed'] > 55),
-        (gdf_edges['highway'] != 'residential')
+    # widths that aren't a number become nan, and nan fails every width comparison
+    gdf_edges['width'] = pd.to_numeric(gdf_edges['width'], errors='coerce')
+    
+    # work with plain arrays, without an index to carry through every comparison
+    lanes = gdf_edges['lanes_assumed'].to_numpy()
+    speed = gdf_edges['maxspeed_assumed'].to_numpy(dtype=float)
+    width = gdf_edges['width'].to_numpy(dtype=float)
+    residential = _has_value(gdf_edges, 'highway', 'residential')
+    
+    return lanes, speed, width, residential
+
+WITH_PARKING_RULES = ['b1', 'b2', 'b3', 'b4', 'b5', 'b6', 'b7', 'b8', 'b9']
+WITH_PARKING_LTS = np.array([1, 3, 3, 2, 2, 2, 3, 4, 3], dtype='int8')
+
+# the speed and width limits checked by bike_lane_analysis_with_parking
+# np.searchsorted puts each edge in a bin: speeds <= 40, <= 50, <= 55, above 55, and nan last;
+# widths <= 4.1, <= 4.25, <= 4.5, and anything else, including nan
+WITH_PARKING_SPEED_BINS = np.array([40, 50, 55, np.inf])
+WITH_PARKING_WIDTH_BINS = np.array([4.1, 4.25, 4.5])
+
+def _with_parking_conditions(lanes, speed, width, residential):
+    """
+    Conditions for bike_lane_analysis_with_parking, in the same order as WITH_PARKING_RULES[1:].
+    When multiple conditions are satisfied, the first one encountered in conditions is used.
+    """
+    return [
+        (lanes >= 3) & (speed <= 55),
+        (width <= 4.1),
+        (width <= 4.25),
+        (width <= 4.5) & (speed <= 40) & residential,
+        (speed > 40) & (speed <= 50),
+        (speed > 50) & (speed <= 55),
+        (speed > 55),
+        ~residential
         ]
 
-    # create a list of the values we want to assign for each condition
-    values = ['b2', 'b3', 'b4', 'b5', 'b6', 'b7', 'b8', 'b9']
-    gdf_edges['rule'] = np.select(conditions, values, default='b1')
-    rule_dict = {'b1':1, 'b2':3, 'b3':3, 'b4':2, 'b5':2, 'b6':2, 'b7':3, 'b8':4, 'b9':3}
-    gdf_edges['lts'] = gdf_edges['rule'].map(rule_dict)
+def _with_parking_table():
+    """
+    Rule code for every combination of lanes >= 3, speed bin, width bin and residential,
+    found by checking the conditions once on a value from each bin.
+    """
+    lanes, speed, width, residential = np.meshgrid([0, 3],
+                                                   np.append(WITH_PARKING_SPEED_BINS, np.nan),
+                                                   np.append(WITH_PARKING_WIDTH_BINS, np.inf),
+                                                   [False, True], indexing='ij')
+    conditions = _with_parking_conditions(lanes, speed, width, residential)
+    return _first_match([condition.ravel() for condition in conditions], default=0, first_code=1).reshape(lanes.shape)
+
+WITH_PARKING_TABLE = _with_parking_table()
+
+def bike_lane_analysis_with_parking(gdf_edges):
+    """
+    Assign LTS to edges with a bike lane and parking.
+    """
+    lanes, speed, width, residential = _bike_lane_values(gdf_edges)
+    
+    if lts_kernels.with_parking_kernel is not None:
+        rule_codes = lts_kernels.with_parking_kernel(lanes, speed, width, residential)
+    else:
+        # bin speed and width once, then look up the rule for each combination of bins
+        speed_bin = np.searchsorted(WITH_PARKING_SPEED_BINS, speed, side='left')
+        width_bin = np.searchsorted(WITH_PARKING_WIDTH_BINS, width, side='left')
+        rule_codes = WITH_PARKING_TABLE[(lanes >= 3).astype('intp'), speed_bin, width_bin, residential.astype('intp')]
+    
+    gdf_edges['rule'] = pd.Categorical.from_codes(rule_codes, categories = WITH_PARKING_RULES)
+    gdf_edges['lts'] = np.take(WITH_PARKING_LTS, rule_codes)
     
     return gdf_edges
 
+NO_PARKING_RULES = ['c1', 'c3', 'c4', 'c5', 'c6', 'c7']
+NO_PARKING_LTS = np.array([1, 3, 2, 3, 4, 3], dtype='int8')
+
 def bike_lane_analysis_no_parking(gdf_edges):
     """
     LTS depends on presence of median, but this is not commonly tagged in OSM. 
     Possibly check the 'dual_carriageway' tag. 
     """
 
-    # get lanes, width, speed
-    gdf_edges = get_lanes(gdf_edges)
-    gdf_edges = get_max_speed(gdf_edges)
-    
-    # assign widths that are a string to nan
-    gdf_edges.loc[gdf_edges[['width']].applymap(lambda x: isinstance(x, str))['width'], 'width'] = np.nan
-    
-    # create a list of lts conditions
-    # When multiple conditions are satisfied, the first one encountered in conditions is used
-    conditions = [
-        (gdf_edges['lanes_assumed'] >= 3) & (gdf_edges['maxspeed_assumed'] <= 65),
-        (gdf_edges[['width']].applymap(lambda x: isinstance(x, float))['width']) & (gdf_edges['width'] <= 1.7),
-        (gdf_edges['maxspeed_assumed'] > 50) & (gdf_edges['maxspeed_assumed'] <= 65),
-        (gdf_edges['maxspeed_assumed'] > 65),
-        (gdf_edges['highway'] != 'residential')
-        ]
-
-    values = ['c3', 'c4', 'c5', 'c6', 'c7']
-    gdf_edges['rule'] = np.select(conditions, values, default='c1')
-    rule_dict = {'c1':1, 'c3':3, 'c4':2, 'c5':3, 'c6':4, 'c7':3}
-    gdf_edges['lts'] = gdf_edges['rule'].map(rule_dict)
+    lanes, speed, width, residential = _bike_lane_values(gdf_edges)
+    
+    if lts_kernels.no_parking_kernel is not None:
+        rule_codes = lts_kernels.no_parking_kernel(lanes, speed, width, residential)
+    else:
+        # create a list of lts conditions
+        # When multiple conditions are satisfied, the first one encountered in conditions is used
+        conditions = [
+            (lanes >= 3) & (speed <= 65),
+            (width <= 1.7),
+            (speed > 50) & (speed <= 65),
+            (speed > 65),
+            ~residential
+            ]
+        rule_codes = _first_match(conditions, default=0, first_code=1)
+    
+    gdf_edges['rule'] = pd.Categorical.from_codes(rule_codes, categories = NO_PARKING_RULES)
+    gdf_edges['lts'] = np.take(NO_PARKING_LTS, rule_codes)
     
     return gdf_edges
 
+# 'm0' is for edges no rule applies to, which only happens when the speed is nan;
+# they get no lts (pd.NA), so lts is a nullable Int8 here
+MIXED_TRAFFIC_RULES = ['m0', 'm17', 'm13', 'm14', 'm2', 'm15', 'm3', 'm4', 'm16', 'm5', 'm6', 'm7', 'm8', 'm9', 'm10', 'm11', 'm12']
+MIXED_TRAFFIC_LTS = pd.array([pd.NA, 1, 1, 2, 2, 2, 2, 2, 2, 2, 3, 3, 4, 2, 3, 4, 4], dtype='Int8')
+
 def mixed_traffic(gdf_edges):
+    """
+    Assign LTS to edges without a bike lane, where cyclists share the road with traffic.
+    """
     # get lanes, width, speed
     gdf_edges = get_lanes(gdf_edges)
     gdf_edges = get_max_speed(gdf_edges)
     
-    # create a list of lts conditions
-    # When multiple conditions are satisfied, the first one encountered in conditions is used
-    conditions = [
-        (gdf_edges['motor_vehicle'] == 'no'),
-         (gdf_edges['highway'] == 'pedestrian'),
-        (gdf_edges['highway'] == 'footway') & (gdf_edges['footway'] == 'crossing'),
-        (gdf_edges['highway'] == 'service') & (gdf_edges['service'] == 'alley'),
-        (gdf_edges['highway'] == 'track'),
-        (gdf_edges['maxspeed_assumed'] <= 50) & (gdf_edges['highway'] == 'service') & (gdf_edges['service'] == 'parking_aisle'),
-        (gdf_edges['maxspeed_assumed'] <= 50) & (gdf_edges['highway'] == 'service') & (gdf_edges['service'] == 'driveway'),
-        (gdf_edges['maxspeed_assumed'] <= 35) & (gdf_edges['highway'] == 'service'),
-        (gdf_edges['maxspeed_assumed'] <= 40) & (gdf_edges['lanes_assumed'] <= 3) & (gdf_edges['highway'] == 'residential'),
-        (gdf_edges['maxspeed_assumed'] <= 40) & (gdf_edges['lanes_assumed'] <= 3),
-        (gdf_edges['maxspeed_assumed'] <= 40) & (gdf_edges['lanes_assumed'] <= 5),
-        (gdf_edges['maxspeed_assumed'] <= 40) & (gdf_edges['lanes_assumed'] > 5),
-        (gdf_edges['maxspeed_assumed'] <= 50) & (gdf_edges['lanes_assumed'] < 3) & (gdf_edges['highway'] == 'residential'),
-        (gdf_edges['maxspeed_assumed'] <= 50) & (gdf_edges['lanes_assumed'] <= 3),
-        (gdf_edges['maxspeed_assumed'] <= 50) & (gdf_edges['lanes_assumed'] > 3),
-        (gdf_edges['maxspeed_assumed'] > 50)
-        ]
-
-    # create a list of the values we want to assign for each condition
-    values = ['m17', 'm13', 'm14', 'm2', 'm15', 'm3', 'm4', 'm16', 'm5', 'm6', 'm7', 'm8', 'm9', 'm10', 'm11', 'm12']
+    # highway and service are codes for the values in MIXED_TRAFFIC_HIGHWAYS and MIXED_TRAFFIC_SERVICES
+    motor_vehicle_no = _has_value(gdf_edges, 'motor_vehicle', 'no')
+    highway = _tag_codes(gdf_edges, 'highway', lts_kernels.MIXED_TRAFFIC_HIGHWAYS)
+    footway_crossing = _has_value(gdf_edges, 'footway', 'crossing')
+    service = _tag_codes(gdf_edges, 'service', lts_kernels.MIXED_TRAFFIC_SERVICES)
+    speed = gdf_edges['maxspeed_assumed'].to_numpy(dtype=float)
+    lanes = gdf_edges['lanes_assumed'].to_numpy()
+    
+    if lts_kernels.mixed_traffic_kernel is not None:
+        rule_codes = lts_kernels.mixed_traffic_kernel(motor_vehicle_no, highway, footway_crossing, service, speed, lanes)
+    else:
+        pedestrian, footway, service_road, track, residential = [highway == code for code in range(5)]
+        alley, parking_aisle, driveway = [service == code for code in range(3)]
+        
+        # create a list of lts conditions
+        # When multiple conditions are satisfied, the first one encountered in conditions is used
+        conditions = [
+            motor_vehicle_no,
+            pedestrian,
+            footway & footway_crossing,
+            service_road & alley,
+            track,
+            (speed <= 50) & service_road & parking_aisle,
+            (speed <= 50) & service_road & driveway,
+            (speed <= 35) & service_road,
+            (speed <= 40) & (lanes <= 3) & residential,
+            (speed <= 40) & (lanes <= 3),
+            (speed <= 40) & (lanes <= 5),
+            (speed <= 40) & (lanes > 5),
+            (speed <= 50) & (lanes < 3) & residential,
+            (speed <= 50) & (lanes <= 3),
+            (speed <= 50) & (lanes > 3),
+            (speed > 50)
+            ]
+        
+        rule_codes = _first_match(conditions, default=0, first_code=1)
 
-    # create a new column and use np.select to assign values to it using our lists as arguments
-    gdf_edges['rule'] = np.select(conditions, values, default='m0')
-              
-    rule_dict = {'m17':1, 'm13':1, 'm14':2, 'm2':2, 'm15':2, 'm3':2, 'm4':2, 'm16':2, 'm5':2, 'm6':3, 'm7':3, 'm8':4, 'm9':2, 'm10':3, 'm11':4, 'm12':4}
-              
-    gdf_edges['lts'] = gdf_edges['rule'].map(rule_dict)
+    gdf_edges['rule'] = pd.Categorical.from_codes(rule_codes, categories = MIXED_TRAFFIC_RULES)
+    gdf_edges['lts'] = MIXED_TRAFFIC_LTS.take(rule_codes)
     
     return gdf_edges
-
-### TESTS ###
-def test_answer():
-    df = pd.DataFrame()
-    assert biking_permitted(df) == 5
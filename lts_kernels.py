@@ -0,0 +1,176 @@
+"""
+Decision trees used by the classifiers in lts_functions, written to walk the edges
+one at a time so numba can compile each tree into a single pass over the edges.
+
+Each kernel takes numpy arrays for the tags and values it checks. Tags compared against
+several values are passed as integer codes: the position of the value in the matching
+tuple below, or -1 for any other value (see lts_functions._tag_codes).
+Each kernel returns the position of the rule that applies to each edge.
+
+If numba isn't installed the kernels are None, and lts_functions evaluates the same
+decisions with numpy instead.
+"""
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# tag values checked by each decision tree, in code order
+NOT_PERMITTED_BICYCLE = ('no', 'yes')
+NOT_PERMITTED_HIGHWAYS = ('motorway', 'motorway_link', 'proposed', 'footway', 'path')
+SEPARATED_PATH_HIGHWAYS = ('cycleway', 'path', 'footway')
+MIXED_TRAFFIC_HIGHWAYS = ('pedestrian', 'footway', 'service', 'track', 'residential')
+MIXED_TRAFFIC_SERVICES = ('alley', 'parking_aisle', 'driveway')
+
+def _compile(function):
+    """Compile function with numba, caching the result on disk, or None if numba isn't installed"""
+    if njit is None:
+        return None
+    return njit(cache=True)(function)
+
+def _not_permitted_rules(bicycle, access_no, highway, footway_sidewalk):
+    """
+    Rules from lts_functions.biking_permitted, ['p2', 'p6', 'p3', 'p4', 'p7', 'p5'].
+    Returns -1 where cycling is permitted.
+    """
+    rule = np.empty(highway.size, dtype=np.int8)
+    for i in range(highway.size):
+        if bicycle[i] == 0:
+            rule[i] = 0 # p2, bicycle no
+        elif access_no[i]:
+            rule[i] = 1 # p6
+        elif highway[i] == 0:
+            rule[i] = 2 # p3, motorway
+        elif highway[i] == 1:
+            rule[i] = 3 # p4, motorway_link
+        elif highway[i] == 2:
+            rule[i] = 4 # p7, proposed
+        elif footway_sidewalk[i] and bicycle[i] != 1 and (highway[i] == 3 or highway[i] == 4):
+            rule[i] = 5 # p5, sidewalk on a footway or path without bicycle yes
+        else:
+            rule[i] = -1
+
+    return rule
+
+def _separated_path_rules(highway, footway_crossing, cycleway_track, cycleway_opposite_track):
+    """
+    Rules from lts_functions.is_separated_path, ['s3', 's1', 's2', 's7', 's8'].
+    Returns -1 where the edge isn't a separated path.
+    """
+    rule = np.empty(highway.size, dtype=np.int8)
+    for i in range(highway.size):
+        if highway[i] == 0:
+            rule[i] = 0 # s3, cycleway
+        elif highway[i] == 1:
+            rule[i] = 1 # s1, path
+        elif highway[i] == 2 and not footway_crossing[i]:
+            rule[i] = 2 # s2, footway
+        elif cycleway_track[i]:
+            rule[i] = 3 # s7
+        elif cycleway_opposite_track[i]:
+            rule[i] = 4 # s8
+        else:
+            rule[i] = -1
+
+    return rule
+
+def _with_parking_rules(lanes, speed, width, residential):
+    """
+    Rules from lts_functions.bike_lane_analysis_with_parking,
+    ['b1', 'b2', 'b3', 'b4', 'b5', 'b6', 'b7', 'b8', 'b9'] with the default 'b1' first.
+    """
+    rule = np.empty(lanes.size, dtype=np.int8)
+    for i in range(lanes.size):
+        if lanes[i] >= 3 and speed[i] <= 55:
+            rule[i] = 1 # b2
+        elif width[i] <= 4.1:
+            rule[i] = 2 # b3
+        elif width[i] <= 4.25:
+            rule[i] = 3 # b4
+        elif width[i] <= 4.5 and speed[i] <= 40 and residential[i]:
+            rule[i] = 4 # b5
+        elif speed[i] > 40 and speed[i] <= 50:
+            rule[i] = 5 # b6
+        elif speed[i] > 50 and speed[i] <= 55:
+            rule[i] = 6 # b7
+        elif speed[i] > 55:
+            rule[i] = 7 # b8
+        elif not residential[i]:
+            rule[i] = 8 # b9
+        else:
+            rule[i] = 0 # b1
+
+    return rule
+
+def _no_parking_rules(lanes, speed, width, residential):
+    """
+    Rules from lts_functions.bike_lane_analysis_no_parking,
+    ['c1', 'c3', 'c4', 'c5', 'c6', 'c7'] with the default 'c1' first.
+    """
+    rule = np.empty(lanes.size, dtype=np.int8)
+    for i in range(lanes.size):
+        if lanes[i] >= 3 and speed[i] <= 65:
+            rule[i] = 1 # c3
+        elif width[i] <= 1.7:
+            rule[i] = 2 # c4
+        elif speed[i] > 50 and speed[i] <= 65:
+            rule[i] = 3 # c5
+        elif speed[i] > 65:
+            rule[i] = 4 # c6
+        elif not residential[i]:
+            rule[i] = 5 # c7
+        else:
+            rule[i] = 0 # c1
+
+    return rule
+
+def _mixed_traffic_rules(motor_vehicle_no, highway, footway_crossing, service, speed, lanes):
+    """
+    Rules from lts_functions.mixed_traffic, with the default 'm0' first.
+    """
+    rule = np.empty(highway.size, dtype=np.int8)
+    for i in range(highway.size):
+        if motor_vehicle_no[i]:
+            rule[i] = 1 # m17
+        elif highway[i] == 0:
+            rule[i] = 2 # m13, pedestrian
+        elif highway[i] == 1 and footway_crossing[i]:
+            rule[i] = 3 # m14, footway
+        elif highway[i] == 2 and service[i] == 0:
+            rule[i] = 4 # m2, service alley
+        elif highway[i] == 3:
+            rule[i] = 5 # m15, track
+        elif speed[i] <= 50 and highway[i] == 2 and service[i] == 1:
+            rule[i] = 6 # m3, service parking_aisle
+        elif speed[i] <= 50 and highway[i] == 2 and service[i] == 2:
+            rule[i] = 7 # m4, service driveway
+        elif speed[i] <= 35 and highway[i] == 2:
+            rule[i] = 8 # m16, service
+        elif speed[i] <= 40 and lanes[i] <= 3 and highway[i] == 4:
+            rule[i] = 9 # m5, residential
+        elif speed[i] <= 40 and lanes[i] <= 3:
+            rule[i] = 10 # m6
+        elif speed[i] <= 40 and lanes[i] <= 5:
+            rule[i] = 11 # m7
+        elif speed[i] <= 40 and lanes[i] > 5:
+            rule[i] = 12 # m8
+        elif speed[i] <= 50 and lanes[i] < 3 and highway[i] == 4:
+            rule[i] = 13 # m9, residential
+        elif speed[i] <= 50 and lanes[i] <= 3:
+            rule[i] = 14 # m10
+        elif speed[i] <= 50 and lanes[i] > 3:
+            rule[i] = 15 # m11
+        elif speed[i] > 50:
+            rule[i] = 16 # m12
+        else:
+            rule[i] = 0 # m0
+
+    return rule
+
+not_permitted_kernel = _compile(_not_permitted_rules)
+separated_path_kernel = _compile(_separated_path_rules)
+with_parking_kernel = _compile(_with_parking_rules)
+no_parking_kernel = _compile(_no_parking_rules)
+mixed_traffic_kernel = _compile(_mixed_traffic_rules)
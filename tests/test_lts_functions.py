@@ -0,0 +1,274 @@
+import os, sys
+import itertools
+import pandas as pd
+import numpy as np
+import pytest
+
+# lts_functions lives at the top of the repository, next to the scripts that use it
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import lts_functions
+import lts_kernels
+
+@pytest.fixture
+def two_edges():
+    """
+    A residential street where cycling is permitted, and a motorway where it isn't.
+    """
+    return pd.DataFrame({'highway': ['residential', 'motorway'],
+                         'bicycle': [np.nan, np.nan],
+                         'access': [np.nan, np.nan],
+                         'footway': [np.nan, np.nan],
+                         'service': [np.nan, np.nan],
+                         'motor_vehicle': [np.nan, np.nan],
+                         'lanes': ['2', '4'],
+                         'maxspeed': ['40', '100'],
+                         })
+
+def test_biking_permitted(two_edges):
+    gdf_allowed, gdf_not_allowed = lts_functions.biking_permitted(two_edges)
+
+    assert len(gdf_allowed) == 1
+    assert len(gdf_not_allowed) == 1
+    assert gdf_allowed['highway'].iloc[0] == 'residential'
+    assert gdf_not_allowed['rule'].iloc[0] == 'p3'
+
+def test_mixed_traffic(two_edges):
+    gdf_allowed, gdf_not_allowed = lts_functions.biking_permitted(two_edges)
+    lts = lts_functions.mixed_traffic(gdf_allowed.copy())
+
+    assert lts['rule'].iloc[0] == 'm5'
+    assert lts['lts'].iloc[0] == 2
+
+def test_classifiers_keep_dtypes(two_edges):
+    """
+    Only prepare_edges converts tag columns, so the caller can still set new tag values.
+    """
+    lts_functions.get_max_speed(two_edges)
+    lts_functions.biking_permitted(two_edges)
+    two_edges.loc[0, 'highway'] = 'tertiary'
+
+    assert two_edges['highway'].iloc[0] == 'tertiary'
+    assert not isinstance(two_edges['highway'].dtype, pd.CategoricalDtype)
+
+def test_max_speed_us_local_default():
+    """
+    Untagged roads that aren't one of the listed types get the local speed.
+    """
+    edges = pd.DataFrame({'highway': ['service', 'residential', 'unclassified'],
+                          'service': ['driveway', np.nan, np.nan],
+                          'motor_vehicle': [np.nan, np.nan, np.nan],
+                          'footway': [np.nan, np.nan, np.nan],
+                          'lanes': [np.nan, np.nan, np.nan],
+                          'maxspeed': [np.nan, np.nan, np.nan],
+                          })
+    edges = lts_functions.get_max_speed_us(edges, local=30)
+
+    assert list(edges['maxspeed_assumed']) == [30, 25, 30]
+
+    lts = lts_functions.mixed_traffic(edges)
+    assert lts['rule'].iloc[0] == 'm4'
+    assert lts['lts'].iloc[0] == 2
+
+def test_max_speed_units():
+    """
+    Speeds with units, several values and lists of values are read in km/h, 'national' has its own speed.
+    """
+    edges = pd.DataFrame({'highway': ['residential'] * 7,
+                          'maxspeed': ['25 mph', '30;50', ['20', '45 mph'], 'national', '10 knots', np.nan, '50'],
+                          })
+    edges = lts_functions.get_max_speed(edges, national=40, local=50)
+
+    assert np.allclose(edges['maxspeed_assumed'], [40.2335, 50, 72.4203, 40, 18.5200, 50, 50], atol=1e-3)
+    # bare numbers are kept exactly, so they compare exactly with the km/h limits
+    assert edges['maxspeed_assumed'].iloc[-1] == 50
+
+def test_max_speed_us_units():
+    """
+    get_max_speed_us reads speeds in mph, bare numbers are km/h.
+    """
+    edges = pd.DataFrame({'highway': ['residential'] * 3,
+                          'maxspeed': ['50', '25 mph', '10 knots'],
+                          })
+    edges = lts_functions.get_max_speed_us(edges)
+
+    assert np.allclose(edges['maxspeed_assumed'], [31.0686, 25, 11.5078], atol=1e-3)
+
+def test_max_speed_us_unreadable():
+    """
+    Tags that can't be read are reported, and the edge gets the speed for its road type.
+    """
+    edges = pd.DataFrame({'highway': ['residential', 'primary', 'residential'],
+                          'maxspeed': ['national', 'walk', '25 mph'],
+                          })
+    with pytest.warns(UserWarning, match='national'):
+        edges = lts_functions.get_max_speed_us(edges, primary=60, residential=25)
+
+    assert list(edges['maxspeed_assumed']) == [25, 60, 25]
+
+def test_mph_speed_lts():
+    """
+    A residential street tagged '60 mph' (about 97 km/h) is fast traffic, whichever analysis it ends up in.
+    """
+    edges = pd.DataFrame({'highway': ['residential'],
+                          'motor_vehicle': [np.nan],
+                          'footway': [np.nan],
+                          'service': [np.nan],
+                          'lanes': ['2'],
+                          'width': [np.nan],
+                          'maxspeed': ['60 mph'],
+                          })
+
+    assert lts_functions.bike_lane_analysis_with_parking(edges.copy())['rule'].iloc[0] == 'b8'
+    assert lts_functions.bike_lane_analysis_no_parking(edges.copy())['rule'].iloc[0] == 'c6'
+    assert lts_functions.mixed_traffic(edges.copy())['rule'].iloc[0] == 'm12'
+
+def test_mixed_traffic_unknown_speed(two_edges):
+    """
+    An edge no mixed traffic rule applies to, because its speed is unknown, gets no lts.
+    """
+    edges = lts_functions.get_lanes(two_edges)
+    edges['maxspeed_assumed'] = np.nan
+    lts = lts_functions.mixed_traffic(edges)
+
+    assert (lts['rule'] == 'm0').all()
+    assert lts['lts'].isna().all()
+
+def _product_frame(**values):
+    """
+    A frame with one edge for every combination of values, given as lists for each column.
+    """
+    rows = list(itertools.product(*values.values()))
+    return pd.DataFrame({column: pd.Series([row[i] for row in rows], dtype=object)
+                         for i, column in enumerate(values)})
+
+def _without_kernel(monkeypatch, kernel, function, edges):
+    """
+    Run function on a copy of edges with and without the numba kernel.
+    """
+    if getattr(lts_kernels, kernel) is None:
+        pytest.skip('numba is not installed')
+
+    compiled = function(edges.copy())
+    monkeypatch.setattr(lts_kernels, kernel, None)
+    evaluated = function(edges.copy())
+    
+    return compiled, evaluated
+
+def test_biking_permitted_numpy_matches_kernel(monkeypatch):
+    edges = _product_frame(bicycle = [np.nan, 'no', 'yes', 'designated', ['no', 'yes']],
+                           access = [np.nan, 'no', 'yes'],
+                           highway = ['motorway', 'motorway_link', 'proposed', 'footway', 'path',
+                                      'residential', np.nan, ['footway', 'residential']],
+                           footway = [np.nan, 'sidewalk', 'crossing', ['sidewalk', 'crossing']])
+
+    compiled, evaluated = _without_kernel(monkeypatch, 'not_permitted_kernel', lts_functions.biking_permitted, edges)
+
+    assert compiled[0].index.equals(evaluated[0].index)
+    assert compiled[1].index.equals(evaluated[1].index)
+    assert (compiled[1]['rule'] == evaluated[1]['rule']).all()
+
+def test_separated_path_numpy_matches_kernel(monkeypatch):
+    edges = _product_frame(highway = ['cycleway', 'path', 'footway', 'residential', np.nan, ['cycleway', 'path']],
+                           footway = [np.nan, 'crossing', 'sidewalk'],
+                           cycleway = [np.nan, 'track', 'opposite_track', 'lane'],
+                           **{'cycleway:left': [np.nan, 'track', ['opposite_track', 'lane']]})
+
+    compiled, evaluated = _without_kernel(monkeypatch, 'separated_path_kernel', lts_functions.is_separated_path, edges)
+
+    assert compiled[0].index.equals(evaluated[0].index)
+    assert compiled[1].index.equals(evaluated[1].index)
+    assert (compiled[0]['rule'] == evaluated[0]['rule']).all()
+
+@pytest.fixture
+def bike_lane_edges():
+    """
+    Edges with a bike lane, at and around each speed and width limit of the bike lane analyses.
+    """
+    edges = _product_frame(highway = ['residential', 'primary', ['residential', 'primary']],
+                           lanes_assumed = [2, 3, 6],
+                           maxspeed_assumed = [30, 40, 45, 50, 52, 55, 60, 65, 70, np.nan],
+                           width = ['1.6', '1.7', '4', '4.1', '4.2', '4.25', '4.5', '4.6', np.nan, 'wide'])
+    edges['lanes_assumed'] = edges['lanes_assumed'].astype('int32')
+    edges['maxspeed_assumed'] = edges['maxspeed_assumed'].astype(float)
+    
+    return edges
+
+def test_with_parking_numpy_matches_kernel(monkeypatch, bike_lane_edges):
+    compiled, evaluated = _without_kernel(monkeypatch, 'with_parking_kernel',
+                                          lts_functions.bike_lane_analysis_with_parking, bike_lane_edges)
+
+    assert (compiled['rule'] == evaluated['rule']).all()
+    assert (compiled['lts'] == evaluated['lts']).all()
+
+def test_no_parking_numpy_matches_kernel(monkeypatch, bike_lane_edges):
+    compiled, evaluated = _without_kernel(monkeypatch, 'no_parking_kernel',
+                                          lts_functions.bike_lane_analysis_no_parking, bike_lane_edges)
+
+    assert (compiled['rule'] == evaluated['rule']).all()
+    assert (compiled['lts'] == evaluated['lts']).all()
+
+def test_mixed_traffic_numpy_matches_kernel(monkeypatch):
+    edges = _product_frame(motor_vehicle = [np.nan, 'no'],
+                           highway = ['pedestrian', 'footway', 'service', 'track', 'residential', 'primary',
+                                      np.nan, ['residential', 'service']],
+                           footway = [np.nan, 'crossing'],
+                           service = [np.nan, 'alley', 'parking_aisle', 'driveway'],
+                           lanes_assumed = [2, 3, 4, 5, 6],
+                           maxspeed_assumed = [30, 35, 36, 40, 45, 50, 55, np.nan])
+    edges['lanes_assumed'] = edges['lanes_assumed'].astype('int32')
+    edges['maxspeed_assumed'] = edges['maxspeed_assumed'].astype(float)
+
+    compiled, evaluated = _without_kernel(monkeypatch, 'mixed_traffic_kernel', lts_functions.mixed_traffic, edges)
+
+    assert (compiled['rule'] == evaluated['rule']).all()
+    assert compiled['lts'].equals(evaluated['lts'])
+
+def test_with_parking_table():
+    """
+    The lookup table gives the same rule as the with-parking conditions
+    on each side of every speed and width limit, and for nan.
+    """
+    def around(limits):
+        return np.concatenate([[0, np.nan, np.inf], limits - 0.01, limits, limits + 0.01])
+
+    lanes, speed, width, residential = [values.ravel() for values in np.meshgrid(
+        [2, 3], around(np.array([40, 50, 55])), around(lts_functions.WITH_PARKING_WIDTH_BINS), [False, True])]
+
+    conditions = lts_functions._with_parking_conditions(lanes, speed, width, residential)
+    expected = np.select(conditions, np.arange(1, len(lts_functions.WITH_PARKING_RULES)), default=0)
+
+    speed_bin = np.searchsorted(lts_functions.WITH_PARKING_SPEED_BINS, speed, side='left')
+    width_bin = np.searchsorted(lts_functions.WITH_PARKING_WIDTH_BINS, width, side='left')
+    found = lts_functions.WITH_PARKING_TABLE[(lanes >= 3).astype('intp'), speed_bin, width_bin, residential.astype('intp')]
+
+    assert (found == expected).all()
+
+@pytest.mark.parametrize('compiled', [True, False])
+def test_nullable_string_tags(monkeypatch, compiled):
+    """
+    Tags in nullable string columns, where comparisons with missing values give NA,
+    are classified the same as tags in object columns.
+    """
+    edges = _product_frame(highway = ['residential', 'footway', 'service', 'motorway', np.nan],
+                           footway = [np.nan, 'sidewalk', 'crossing'],
+                           bicycle = [np.nan, 'no', 'yes'],
+                           access = [np.nan, 'no'],
+                           service = [np.nan, 'driveway'],
+                           motor_vehicle = [np.nan, 'no'],
+                           cycleway = [np.nan, 'track'],
+                           lanes = [np.nan, '4'],
+                           maxspeed = [np.nan, '30 mph'])
+    nullable = edges.astype('string')
+    if not compiled:
+        for kernel in ['not_permitted_kernel', 'separated_path_kernel', 'mixed_traffic_kernel']:
+            monkeypatch.setattr(lts_kernels, kernel, None)
+
+    for function in [lts_functions.biking_permitted, lts_functions.is_separated_path]:
+        expected, found = function(edges.copy()), function(nullable.copy())
+        assert expected[0].index.equals(found[0].index)
+        assert expected[1].index.equals(found[1].index)
+
+    expected = lts_functions.mixed_traffic(edges.copy())
+    found = lts_functions.mixed_traffic(nullable.copy())
+    assert (expected['rule'] == found['rule']).all()